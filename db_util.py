@@ -1,21 +1,350 @@
+import atexit
+import json
+import queue
 import sqlite3
+import threading
+from collections import defaultdict
 from contextlib import contextmanager
 
 
 
 DB_PATH = "invoices.db"
+POOL_SIZE = 5
+CHECKPOINT_INTERVAL = 60  # seconds between background WAL checkpoints
+STAGING_FLUSH_EVERY = 100  # staged writes between backup flushes to disk
+
+# SQL lives in module-level constants so every call passes the exact
+# same string object to execute(), guaranteeing a hit in the
+# per-connection prepared-statement cache.
+SQL_UPSERT_INVOICE = """
+    INSERT INTO invoices
+    (InvoiceId, VendorName, InvoiceDate, BillingAddressRecipient,
+     ShippingAddress, SubTotal, ShippingCost, InvoiceTotal, ItemsJson)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(InvoiceId) DO UPDATE SET
+        VendorName = excluded.VendorName,
+        InvoiceDate = excluded.InvoiceDate,
+        BillingAddressRecipient = excluded.BillingAddressRecipient,
+        ShippingAddress = excluded.ShippingAddress,
+        SubTotal = excluded.SubTotal,
+        ShippingCost = excluded.ShippingCost,
+        InvoiceTotal = excluded.InvoiceTotal,
+        ItemsJson = excluded.ItemsJson
+"""
+
+SQL_UPSERT_CONFIDENCE = """
+    INSERT INTO confidences
+    (InvoiceId, VendorName, InvoiceDate, BillingAddressRecipient,
+     ShippingAddress, SubTotal, ShippingCost, InvoiceTotal)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(InvoiceId) DO UPDATE SET
+        VendorName = excluded.VendorName,
+        InvoiceDate = excluded.InvoiceDate,
+        BillingAddressRecipient = excluded.BillingAddressRecipient,
+        ShippingAddress = excluded.ShippingAddress,
+        SubTotal = excluded.SubTotal,
+        ShippingCost = excluded.ShippingCost,
+        InvoiceTotal = excluded.InvoiceTotal
+"""
+
+SQL_DELETE_ITEMS = "DELETE FROM items WHERE InvoiceId = ?"
+
+SQL_INSERT_ITEM = """
+    INSERT INTO items
+    (InvoiceId, Description, Name, Quantity, UnitPrice, Amount)
+    VALUES (?, ?, ?, ?, ?, ?)
+"""
+
+# One round-trip for an invoice and its items. The join only kicks in
+# for legacy rows without ItemsJson; otherwise the extra condition
+# keeps the result to a single row with the items inline as JSON.
+SQL_SELECT_INVOICE_WITH_ITEMS = """
+    SELECT i.InvoiceId, i.VendorName, i.InvoiceDate, i.BillingAddressRecipient,
+           i.ShippingAddress, i.SubTotal, i.ShippingCost, i.InvoiceTotal,
+           i.ItemsJson,
+           it.id, it.Description, it.Name, it.Quantity, it.UnitPrice, it.Amount
+    FROM invoices i
+    LEFT JOIN items it
+        ON it.InvoiceId = i.InvoiceId AND i.ItemsJson IS NULL
+    WHERE i.InvoiceId = ?;
+"""
+
+SQL_SELECT_VENDOR_INVOICES = """
+    SELECT InvoiceId, VendorName, InvoiceDate, BillingAddressRecipient,
+           ShippingAddress, SubTotal, ShippingCost, InvoiceTotal, ItemsJson
+    FROM invoices
+    WHERE VendorName = ?;
+"""
+
+SQL_SELECT_VENDOR_ITEMS = """
+    SELECT InvoiceId, Description, Name, Quantity, UnitPrice, Amount
+    FROM items
+    WHERE InvoiceId IN (SELECT InvoiceId FROM invoices WHERE VendorName = ?);
+"""
+
+
+def _apply_pragmas(conn, readonly=False):
+    if readonly:
+        # Reads get a bigger mmap window so pages come straight from
+        # the OS page cache, and query_only guards against accidental
+        # writes through the read pool
+        conn.execute("PRAGMA mmap_size=1073741824")
+        conn.execute("PRAGMA query_only=ON")
+    else:
+        # WAL keeps readers and writers from blocking each other, and
+        # synchronous=NORMAL drops the double fsync per commit that the
+        # default DELETE journal pays. Safe together: WAL + NORMAL only
+        # risks losing the last transactions on power loss, never corruption.
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute("PRAGMA mmap_size=268435456")
+        # Checkpointing happens in the background thread, never inside
+        # a commit on the request path
+        conn.execute("PRAGMA wal_autocheckpoint=0")
+    conn.execute("PRAGMA cache_size=-65536")
+    conn.execute("PRAGMA busy_timeout=3000")
+
+
+# Pools of long-lived connections so each call reuses SQLite's warm
+# page cache instead of paying connect/teardown per request. Reads go
+# through a separate read-only pool; under WAL they never block (or
+# get blocked by) the writers in the read/write pool.
+_pool = queue.Queue(maxsize=POOL_SIZE)
+_ro_pool = queue.Queue(maxsize=POOL_SIZE)
+
+
+def _acquire_conn():
+    try:
+        return _pool.get_nowait()
+    except queue.Empty:
+        # cached_statements keeps the compiled form of our handful of
+        # SQL strings alive for the life of the pooled connection, so
+        # repeated calls skip the parse/prepare step entirely
+        conn = sqlite3.connect(
+            DB_PATH, check_same_thread=False, cached_statements=256
+        )
+        # Autocommit mode: transactions are opened explicitly with
+        # BEGIN so a whole invoice save costs a single fsync.
+        conn.isolation_level = None
+        # Row gives C-level mapping rows, so result dicts are built
+        # with dict(row) instead of manual tuple indexing
+        conn.row_factory = sqlite3.Row
+        _apply_pragmas(conn)
+        return conn
+
+
+def _acquire_ro_conn():
+    try:
+        return _ro_pool.get_nowait()
+    except queue.Empty:
+        conn = sqlite3.connect(
+            "file:%s?mode=ro" % DB_PATH, uri=True,
+            check_same_thread=False, cached_statements=256
+        )
+        conn.row_factory = sqlite3.Row
+        _apply_pragmas(conn, readonly=True)
+        return conn
+
+
+def _release_conn(conn):
+    try:
+        _pool.put_nowait(conn)
+    except queue.Full:
+        conn.close()
+
+
+def _release_ro_conn(conn):
+    try:
+        _ro_pool.put_nowait(conn)
+    except queue.Full:
+        conn.close()
+
+
+def close_pool():
+    """Closes every pooled connection. Called automatically at exit."""
+    for pool in (_pool, _ro_pool):
+        while True:
+            try:
+                conn = pool.get_nowait()
+            except queue.Empty:
+                break
+            if pool is _pool:
+                # Let SQLite refresh its query-planner stats before closing
+                conn.execute("PRAGMA optimize")
+            conn.close()
+
+
+atexit.register(close_pool)
+
+
+# Background WAL maintenance. With wal_autocheckpoint off, commits
+# never pause to fold the WAL back into the main DB file; this thread
+# does it on a timer instead, trading occasional commit spikes for a
+# steady commit cost.
+_checkpoint_thread = None
+_checkpoint_stop = threading.Event()
+
+
+def _checkpoint_loop():
+    while not _checkpoint_stop.wait(CHECKPOINT_INTERVAL):
+        try:
+            conn = sqlite3.connect(DB_PATH)
+            try:
+                conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+                conn.execute("PRAGMA optimize")
+            finally:
+                conn.close()
+        except sqlite3.Error:
+            # A locked DB just means we retry on the next tick; never
+            # let a transient error kill the maintenance thread
+            pass
+
+
+def start_checkpoint_thread():
+    """Starts the background WAL checkpoint thread (idempotent)."""
+    global _checkpoint_thread
+    if _checkpoint_thread is not None and _checkpoint_thread.is_alive():
+        return
+    _checkpoint_stop.clear()
+    _checkpoint_thread = threading.Thread(
+        target=_checkpoint_loop, name="db-wal-checkpoint", daemon=True
+    )
+    _checkpoint_thread.start()
+
+
+# Optional in-memory staging for bursty ingest. When enabled, every
+# call works against a :memory: copy of the DB seeded from disk, and
+# the whole copy is persisted with one sequential backup() every
+# STAGING_FLUSH_EVERY writes instead of random B-tree writes per save.
+# Off by default: a crash between flushes loses the staged writes.
+_staging_conn = None
+_staging_lock = threading.Lock()
+_staging_writes = 0
+
+
+def enable_memory_staging():
+    """Routes all DB access through an in-memory copy of the database.
+
+    Saves land at RAM speed and reach disk in periodic sequential
+    backups (see flush_staging), at the cost of losing the writes
+    staged since the last flush if the process dies.
+    """
+    global _staging_conn
+    if _staging_conn is not None:
+        return
+    mem = sqlite3.connect(
+        ":memory:", check_same_thread=False, cached_statements=256
+    )
+    mem.isolation_level = None
+    mem.row_factory = sqlite3.Row
+    # Seed the staging copy from disk so reads stay complete
+    disk = sqlite3.connect(DB_PATH)
+    try:
+        disk.backup(mem)
+    finally:
+        disk.close()
+    _staging_conn = mem
+
+
+def _flush_staging_locked():
+    global _staging_writes
+    disk = sqlite3.connect(DB_PATH)
+    try:
+        _staging_conn.backup(disk)
+    finally:
+        disk.close()
+    _staging_writes = 0
+
+
+def flush_staging():
+    """Persists the staging DB to disk with one sequential backup."""
+    if _staging_conn is None:
+        return
+    with _staging_lock:
+        _flush_staging_locked()
+
+
+def disable_memory_staging():
+    """Flushes the staging DB and goes back to direct disk access."""
+    global _staging_conn
+    if _staging_conn is None:
+        return
+    with _staging_lock:
+        _flush_staging_locked()
+        _staging_conn.close()
+        _staging_conn = None
+
+
+atexit.register(disable_memory_staging)
+
 
 @contextmanager
-def get_db():
-    conn = sqlite3.connect(DB_PATH)
+def get_db(readonly=False):
+    global _staging_writes
+    if _staging_conn is not None:
+        # Staging mode: everything reads and writes the memory copy,
+        # serialized by the lock since it is a single shared connection
+        with _staging_lock:
+            conn = _staging_conn
+            try:
+                yield conn
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            if not readonly:
+                _staging_writes += 1
+                if _staging_writes >= STAGING_FLUSH_EVERY:
+                    _flush_staging_locked()
+        return
+    if readonly:
+        try:
+            conn = _acquire_ro_conn()
+        except sqlite3.OperationalError:
+            # The DB file (or its WAL side files) doesn't exist yet;
+            # serve the read through the read/write pool instead
+            conn = None
+        if conn is not None:
+            try:
+                yield conn
+            finally:
+                _release_ro_conn(conn)
+            return
+    conn = _acquire_conn()
     try:
         yield conn
         conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        _release_conn(conn)
+
+
+def _configure_page_size():
+    # 8K pages keep invoice rows with long addresses and inline items
+    # on fewer pages, lowering B-tree depth. The page size only
+    # changes outside WAL and takes effect through VACUUM, so this
+    # runs on a direct connection before the pools touch the file.
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        if conn.execute("PRAGMA page_size").fetchone()[0] == 8192:
+            return
+        conn.execute("PRAGMA journal_mode=DELETE")
+        conn.execute("PRAGMA page_size=8192")
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute("VACUUM")
+    except sqlite3.OperationalError:
+        # Another connection already has the file open in WAL mode;
+        # keep the existing page size rather than failing init
+        pass
     finally:
         conn.close()
 
 
 def init_db():
+    _configure_page_size()
     with get_db() as conn:
         cursor = conn.cursor()
         
@@ -28,10 +357,17 @@ def init_db():
                 ShippingAddress TEXT,
                 SubTotal REAL,
                 ShippingCost REAL,
-                InvoiceTotal REAL
-                
+                InvoiceTotal REAL,
+                ItemsJson TEXT
+
             )
         """)
+
+        # DB files created before ItemsJson existed need the column
+        # added in place (CREATE IF NOT EXISTS leaves them untouched)
+        cursor.execute("PRAGMA table_info(invoices)")
+        if "ItemsJson" not in [col["name"] for col in cursor.fetchall()]:
+            cursor.execute("ALTER TABLE invoices ADD COLUMN ItemsJson TEXT")
         
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS confidences (
@@ -49,7 +385,7 @@ def init_db():
         
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS items (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                id INTEGER PRIMARY KEY,
                 InvoiceId TEXT,
                 Description TEXT,
                 Name TEXT,
@@ -60,93 +396,174 @@ def init_db():
             )
         """)
 
+        # Index the lookup columns so vendor queries and per-invoice
+        # item reads/deletes seek instead of scanning the whole table
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_invoices_vendor ON invoices(VendorName)"
+        )
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_items_invoice ON items(InvoiceId)"
+        )
 
-def save_inv_extraction(result):
-    data = result.get("data", {})
-    data_confidence = result.get("dataConfidence", {})
-    
-    invoice_id = data.get("InvoiceId")
-    if invoice_id:
-        with get_db() as conn:
-            cursor = conn.cursor()
-            
-            # Insert invoice
-            cursor.execute("""
-                INSERT OR REPLACE INTO invoices 
-                (InvoiceId, VendorName, InvoiceDate, BillingAddressRecipient, 
-                 ShippingAddress, SubTotal, ShippingCost, InvoiceTotal)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                invoice_id,
-                data.get("VendorName"),
-                data.get("InvoiceDate"),
-                data.get("BillingAddressRecipient"),
-                data.get("ShippingAddress"),
-                data.get("SubTotal"),
-                data.get("ShippingCost"),
-                data.get("InvoiceTotal")
-            ))
-            
-            # Insert confidences
-            cursor.execute("""
-                INSERT OR REPLACE INTO confidences 
-                (InvoiceId, VendorName, InvoiceDate, BillingAddressRecipient,
-                 ShippingAddress, SubTotal, ShippingCost, InvoiceTotal)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
+    # WAL checkpointing runs on a timer once the schema exists
+    start_checkpoint_thread()
+
+
+"""
+    Saves a batch of extraction results in one transaction.
+    All invoice, confidence and item rows are grouped into lists and
+    written with three executemany calls, so a whole batch costs a
+    single commit/fsync no matter how many invoices it holds.
+    Parameters:
+        results (list): Extraction result dicts as produced by /extract.
+"""
+def save_many_invoices(results):
+    invoice_rows = []
+    confidence_rows = []
+    delete_rows = []
+    item_rows = []
+    for result in results:
+        data = result.get("data", {})
+        data_confidence = result.get("dataConfidence", {})
+
+        invoice_id = data.get("InvoiceId")
+        if not invoice_id:
+            continue
+        line_items = data.get("Items", [])
+
+        # Invoice row, with the items co-stored as JSON so reads get
+        # everything from the invoice row alone
+        invoice_rows.append((
+            invoice_id,
+            data.get("VendorName"),
+            data.get("InvoiceDate"),
+            data.get("BillingAddressRecipient"),
+            data.get("ShippingAddress"),
+            data.get("SubTotal"),
+            data.get("ShippingCost"),
+            data.get("InvoiceTotal"),
+            json.dumps(line_items)
+        ))
+
+        # Confidence row
+        confidence_rows.append((
+            invoice_id,
+            data_confidence.get("VendorName"),
+            data_confidence.get("InvoiceDate"),
+            data_confidence.get("BillingAddressRecipient"),
+            data_confidence.get("ShippingAddress"),
+            data_confidence.get("SubTotal"),
+            data_confidence.get("ShippingCost"),
+            data_confidence.get("InvoiceTotal")
+        ))
+
+        # Item rows, kept in sync for item-level queries and readers
+        # that predate the ItemsJson column
+        delete_rows.append((invoice_id,))
+        item_rows.extend(
+            (
                 invoice_id,
-                data_confidence.get("VendorName"),
-                data_confidence.get("InvoiceDate"),
-                data_confidence.get("BillingAddressRecipient"),
-                data_confidence.get("ShippingAddress"),
-                data_confidence.get("SubTotal"),
-                data_confidence.get("ShippingCost"),
-                data_confidence.get("InvoiceTotal")
-            ))
-            
-            # Insert line items
-            line_items = data.get("Items", [])
-            cursor.execute("DELETE FROM items WHERE InvoiceId = ?", (invoice_id,))
-            for item in line_items:
-                cursor.execute("""
-                    INSERT INTO items 
-                    (InvoiceId, Description, Name, Quantity, UnitPrice, Amount)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                """, (
-                    invoice_id,
-                    item.get("Description"),
-                    item.get("Name"),
-                    item.get("Quantity"),
-                    item.get("UnitPrice"),
-                    item.get("Amount")
-                ))
+                item.get("Description"),
+                item.get("Name"),
+                item.get("Quantity"),
+                item.get("UnitPrice"),
+                item.get("Amount")
+            )
+            for item in line_items
+        )
+
+    if not invoice_rows:
+        return
+
+    with get_db() as conn:
+        cursor = conn.cursor()
+        # One explicit transaction around all the writes, so the whole
+        # batch is a single fsync instead of one per statement
+        cursor.execute("BEGIN IMMEDIATE")
+        cursor.executemany(SQL_UPSERT_INVOICE, invoice_rows)
+        cursor.executemany(SQL_UPSERT_CONFIDENCE, confidence_rows)
+        cursor.executemany(SQL_DELETE_ITEMS, delete_rows)
+        cursor.executemany(SQL_INSERT_ITEM, item_rows)
+        # get_db rolls back on exception, so this only runs when
+        # every statement above succeeded
+        cursor.execute("COMMIT")
+
+
+def save_inv_extraction(result):
+    save_many_invoices([result])
 """
     Retrieves all invoices associated with a given vendor name.
-    This function queries the database for invoice IDs that match the provided
-    vendor name, then fetches the full invoice details for each invoice ID.
+    iter_invoices_by_vendor streams the invoices one at a time as they
+    come off the cursor, keeping memory flat for large vendors;
+    get_invoices_by_vendor materializes them into a list.
     Parameters:
         vendor_name (str): The name of the vendor.
     Returns:
-        list: A list of invoice records associated with the vendor.
-              Returns an empty list if no invoices are found.
+        generator | list: Invoice records associated with the vendor.
+              get_invoices_by_vendor returns an empty list if none are found.
 """
+def iter_invoices_by_vendor(vendor_name):
+    if _staging_conn is not None:
+        # Staging mode: the shared staging connection is guarded by a
+        # non-reentrant lock, so snapshot the whole result in one
+        # short critical section and yield only after it is released.
+        # Suspending a generator while holding the lock would deadlock
+        # nested reads and block writers in every other thread.
+        with get_db(readonly=True) as conn:
+            invoices = list(_iter_vendor_invoices(conn, vendor_name))
+        yield from invoices
+        return
+    # Open a read-only database connection using the context manager;
+    # it goes back to the pool when the generator is exhausted
+    with get_db(readonly=True) as conn:
+        yield from _iter_vendor_invoices(conn, vendor_name)
+
+
+def _iter_vendor_invoices(conn, vendor_name):
+    # Create a database cursor to execute SQL queries
+    cursor = conn.cursor()
+    # Fetch every invoice of the vendor in one query instead of
+    # calling getInvoiceById per InvoiceId (2N+1 queries)
+    cursor.execute(SQL_SELECT_VENDOR_INVOICES, (vendor_name,))
+    items_by_invoice = None
+    # Stream straight off the cursor: each invoice dict is yielded
+    # while SQLite reads ahead, instead of materializing the full
+    # result list first
+    for row in cursor:
+        invoice = dict(row)
+        items_json = invoice.pop("ItemsJson")
+        if items_json is not None:
+            invoice["Items"] = json.loads(items_json)
+        else:
+            # Rows saved before ItemsJson existed: bucket the
+            # vendor's items once, on the first legacy row
+            if items_by_invoice is None:
+                items_by_invoice = _vendor_items_by_invoice(conn, vendor_name)
+            invoice["Items"] = items_by_invoice[invoice["InvoiceId"]]
+        yield invoice
+
+
+def _vendor_items_by_invoice(conn, vendor_name):
+    # A second cursor, so the invoice iteration keeps streaming
+    cursor = conn.cursor()
+    cursor.execute(SQL_SELECT_VENDOR_ITEMS, (vendor_name,))
+    items_by_invoice = defaultdict(list)
+    # Tuple unpacking into a dict literal is cheaper per row
+    # than dict(row) plus a key pop
+    for inv_id, desc, name, qty, price, amount in cursor:
+        items_by_invoice[inv_id].append({
+            "Description": desc,
+            "Name": name,
+            "Quantity": qty,
+            "UnitPrice": price,
+            "Amount": amount
+        })
+    return items_by_invoice
+
+
 def get_invoices_by_vendor(vendor_name):
-    # Open a database connection using the context manager
-    with get_db() as conn:
-        # Create a database cursor to execute SQL queries
-        cursor = conn.cursor()
-        # Execute a query to retrieve invoice IDs for the given vendor name
-        cursor.execute("select InvoiceId from invoices where VendorName = ?",(vendor_name,))
-        # Fetch all matching rows from the query result
-        rows= cursor.fetchall()
-        invoices = []
-        # Iterate over each returned row
-        for r in rows:
-            invoice_id = r[0]  
-            # Retrieve the full invoice details using the invoice ID
-            invoices.append(getInvoiceById(invoice_id))  
-    # Return the list of invoices associated with the vendor        
-    return invoices
+    # Return the list of invoices associated with the vendor
+    return list(iter_invoices_by_vendor(vendor_name))
 """
     Retrieves a single invoice and its associated items by invoice ID.
     This function queries the database for an invoice record using the given
@@ -155,54 +572,55 @@ def get_invoices_by_vendor(vendor_name):
     invoice details and its items.
     Parameters:
         invoice_id (str | int): The unique identifier of the invoice.
+        conn (sqlite3.Connection | None): An already-open connection to reuse.
+            When None, a connection is borrowed from the pool for this call.
     Returns:
         dict | None: A dictionary containing invoice details and items if found,
                      or None if the invoice does not exist.
 """
-def getInvoiceById(invoice_id):
-    with get_db() as conn:
-        cursor = conn.cursor()
-        # Query the invoices table for the invoice with the given ID
-        cursor.execute("""
-            SELECT *
-            FROM invoices
-            WHERE InvoiceId = ?;
-        """, (invoice_id,))
-        # Fetch a single invoice record
-        row = cursor.fetchone()
-        if not row:
-            return None
-        # Query the items table for all items related to the invoice
-        cursor.execute("""
-            SELECT Description, Name, Quantity, UnitPrice, Amount
-            FROM items
-            WHERE InvoiceId = ?;
-        """, (invoice_id,))
-        # Fetch all item rows related to the invoice
-        items_rows = cursor.fetchall()
-    
-    items = []
-    # Iterate over each item row and build a structured dictionary
-    for item in items_rows:
-        items.append({
-            "Description": item[0],
-            "Name": item[1],
-            "Quantity": item[2],
-            "UnitPrice": item[3],
-            "Amount": item[4]
-        })
-    # Return the full invoice data including its items
-    return {
-        "InvoiceId": row[0],
-        "VendorName": row[1],
-        "InvoiceDate": row[2],
-        "BillingAddressRecipient": row[3],
-        "ShippingAddress": row[4],
-        "SubTotal": row[5],
-        "ShippingCost": row[6],
-        "InvoiceTotal": row[7],
-        "Items": items
-    }
+def getInvoiceById(invoice_id, conn=None):
+    # Reuse the caller's connection when one is passed in, so callers
+    # issuing many lookups don't pay a pool round-trip per invoice
+    if conn is not None:
+        return _get_invoice_by_id(conn, invoice_id)
+    with get_db(readonly=True) as conn:
+        return _get_invoice_by_id(conn, invoice_id)
+
+
+def _get_invoice_by_id(conn, invoice_id):
+    cursor = conn.cursor()
+    # Fetch the invoice together with its items in a single query
+    cursor.execute(SQL_SELECT_INVOICE_WITH_ITEMS, (invoice_id,))
+    rows = cursor.fetchall()
+    if not rows:
+        return None
+
+    # The invoice columns repeat on every joined row; take the first
+    invoice = dict(rows[0])
+    items_json = invoice.pop("ItemsJson")
+    for key in ("id", "Description", "Name", "Quantity", "UnitPrice", "Amount"):
+        invoice.pop(key)
+    if items_json is not None:
+        # Items live on the invoice row itself
+        invoice["Items"] = json.loads(items_json)
+        return invoice
+
+    # Rows saved before ItemsJson existed: accumulate the joined item
+    # columns. it.id is NOT NULL for real items, so a NULL id is the
+    # one reliable sign the LEFT JOIN matched nothing; the payload
+    # columns themselves may legitimately be NULL.
+    invoice["Items"] = [
+        {
+            "Description": row["Description"],
+            "Name": row["Name"],
+            "Quantity": row["Quantity"],
+            "UnitPrice": row["UnitPrice"],
+            "Amount": row["Amount"]
+        }
+        for row in rows
+        if row["id"] is not None
+    ]
+    return invoice
 def clean_db():
     """
     Cleans the database by removing all test data.
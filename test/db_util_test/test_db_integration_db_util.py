@@ -0,0 +1,181 @@
+import os
+import tempfile
+import unittest
+
+import db_util
+
+
+def get_extraction_result(invoice_id="2910", vendor_name="SuperStore"):
+    return {
+        "data": {
+            "InvoiceId": invoice_id,
+            "VendorName": vendor_name,
+            "InvoiceDate": "2012-03-06T00:00:00+00:00",
+            "BillingAddressRecipient": "Aaron Bergman",
+            "ShippingAddress": "98103, Seattle, Washington, United States",
+            "SubTotal": 53.82,
+            "ShippingCost": 4.29,
+            "InvoiceTotal": 58.11,
+            "Items": [
+                {
+                    "Description": "USB-C Charging Cable",
+                    "Name": "USB Cable",
+                    "Quantity": 2,
+                    "UnitPrice": 9.99,
+                    "Amount": 19.98,
+                },
+                {
+                    "Description": "Wireless Mouse",
+                    "Name": "Mouse",
+                    "Quantity": 1,
+                    "UnitPrice": 19.99,
+                    "Amount": 19.99,
+                },
+            ],
+        },
+        "dataConfidence": {
+            "VendorName": 0.99,
+            "InvoiceDate": 0.95,
+            "BillingAddressRecipient": 0.90,
+            "ShippingAddress": 0.92,
+            "SubTotal": 0.97,
+            "ShippingCost": 0.88,
+            "InvoiceTotal": 0.98,
+        },
+    }
+
+
+class TestDbUtilIntegration(unittest.TestCase):
+
+    def setUp(self):
+        # point db_util at a fresh temp file so tests never touch the
+        # real invoices.db
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self._old_db_path = db_util.DB_PATH
+        db_util.DB_PATH = os.path.join(self._tmpdir.name, "invoices.db")
+        db_util.init_db()
+
+    def tearDown(self):
+        # drop staging state and pooled connections bound to the temp file
+        db_util.disable_memory_staging()
+        db_util.close_pool()
+        db_util.DB_PATH = self._old_db_path
+        self._tmpdir.cleanup()
+    #-------------------------------------SAVE-AND-READ------------------------------------#
+    def test_save_and_get_invoice_roundtrip(self):
+        result = get_extraction_result()
+        db_util.save_inv_extraction(result)
+        invoice = db_util.getInvoiceById("2910")
+        self.assertIsNotNone(invoice)
+        self.assertEqual(invoice["InvoiceId"], "2910")
+        self.assertEqual(invoice["VendorName"], "SuperStore")
+        self.assertEqual(invoice["InvoiceTotal"], 58.11)
+        self.assertEqual(invoice["Items"], result["data"]["Items"])
+
+    def test_get_invoice_by_id_not_found(self):
+        invoice = db_util.getInvoiceById("9999999")
+        self.assertIsNone(invoice)
+
+    def test_resave_replaces_items(self):
+        result = get_extraction_result()
+        db_util.save_inv_extraction(result)
+        db_util.save_inv_extraction(result)
+        invoice = db_util.getInvoiceById("2910")
+        self.assertEqual(len(invoice["Items"]), 2)
+
+    def test_save_many_invoices_batch(self):
+        batch = [
+            get_extraction_result(invoice_id=str(i), vendor_name="BatchStore")
+            for i in range(1, 4)
+        ]
+        db_util.save_many_invoices(batch)
+        invoices = db_util.get_invoices_by_vendor("BatchStore")
+        self.assertIsInstance(invoices, list)
+        self.assertEqual(len(invoices), 3)
+        for invoice in invoices:
+            self.assertEqual(invoice["VendorName"], "BatchStore")
+            self.assertEqual(len(invoice["Items"]), 2)
+
+    def test_iter_invoices_by_vendor_streams(self):
+        db_util.save_many_invoices([
+            get_extraction_result(invoice_id=str(i), vendor_name="IterStore")
+            for i in range(1, 3)
+        ])
+        gen = db_util.iter_invoices_by_vendor("IterStore")
+        first = next(gen)
+        self.assertEqual(first["VendorName"], "IterStore")
+        rest = list(gen)
+        self.assertEqual(len(rest), 1)
+    #-------------------------------------LEGACY-ROWS------------------------------------#
+    def test_legacy_rows_without_items_json(self):
+        # rows written before the ItemsJson column have it NULL and
+        # keep their items only in the items table
+        with db_util.get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "INSERT INTO invoices (InvoiceId, VendorName) VALUES ('100', 'OldStore')"
+            )
+            cursor.execute(
+                "INSERT INTO items (InvoiceId, Description, Name, Quantity, UnitPrice, Amount)"
+                " VALUES ('100', 'USB-C Charging Cable', 'USB Cable', 2, 9.99, 19.98)"
+            )
+            # item whose Description, Name and Amount are all NULL must
+            # still be returned (regression: it was treated as a join miss)
+            cursor.execute(
+                "INSERT INTO items (InvoiceId, Quantity, UnitPrice) VALUES ('100', 3, 4.0)"
+            )
+        by_id = db_util.getInvoiceById("100")
+        self.assertIsNotNone(by_id)
+        self.assertEqual(len(by_id["Items"]), 2)
+        by_vendor = db_util.get_invoices_by_vendor("OldStore")
+        self.assertEqual(len(by_vendor), 1)
+        # both read paths must agree on the same invoice
+        self.assertEqual(by_id["Items"], by_vendor[0]["Items"])
+
+    def test_legacy_row_with_no_items(self):
+        with db_util.get_db() as conn:
+            conn.execute(
+                "INSERT INTO invoices (InvoiceId, VendorName) VALUES ('200', 'EmptyStore')"
+            )
+        invoice = db_util.getInvoiceById("200")
+        self.assertIsNotNone(invoice)
+        self.assertEqual(invoice["Items"], [])
+    #-------------------------------------MEMORY-STAGING------------------------------------#
+    def test_memory_staging_enable_flush_disable(self):
+        db_util.enable_memory_staging()
+        db_util.save_inv_extraction(get_extraction_result())
+        # staged write is readable right away but not on disk yet
+        self.assertIsNotNone(db_util.getInvoiceById("2910"))
+        import sqlite3
+        disk = sqlite3.connect(db_util.DB_PATH)
+        count = disk.execute(
+            "SELECT COUNT(*) FROM invoices WHERE InvoiceId = '2910'"
+        ).fetchone()[0]
+        self.assertEqual(count, 0)
+        # flush persists the staged rows
+        db_util.flush_staging()
+        count = disk.execute(
+            "SELECT COUNT(*) FROM invoices WHERE InvoiceId = '2910'"
+        ).fetchone()[0]
+        disk.close()
+        self.assertEqual(count, 1)
+        # after disabling, reads come from disk and still see the row
+        db_util.disable_memory_staging()
+        invoice = db_util.getInvoiceById("2910")
+        self.assertIsNotNone(invoice)
+        self.assertEqual(len(invoice["Items"]), 2)
+
+    def test_staged_iteration_allows_nested_reads(self):
+        # regression: iterating in staging mode used to hold the
+        # staging lock across yields, deadlocking any nested DB call
+        db_util.save_many_invoices([
+            get_extraction_result(invoice_id=str(i), vendor_name="StageStore")
+            for i in range(1, 3)
+        ])
+        db_util.enable_memory_staging()
+        gen = db_util.iter_invoices_by_vendor("StageStore")
+        first = next(gen)
+        nested = db_util.getInvoiceById(first["InvoiceId"])
+        self.assertIsNotNone(nested)
+        self.assertEqual(nested["InvoiceId"], first["InvoiceId"])
+        self.assertEqual(len(list(gen)), 1)